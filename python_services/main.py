@@ -6,21 +6,126 @@ Provides advanced medical data analysis capabilities for the AI-Powered Medical
 
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import pandas as pd
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict
 import numpy as np
+import numba
+import orjson
 import json
+import re
+import hashlib
+import time
+from collections import OrderedDict
 from typing import List, Dict, Optional, Any
 import uvicorn
 import os
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
+
+class NumpyORJSONResponse(JSONResponse):
+    """JSON response encoded by orjson, with native support for NumPy scalars and arrays"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+class ResponseCacheMiddleware:
+    """In-process cache of successful POST responses, keyed by a hash of the path and request body
+
+    Entries expire ttl_seconds after they are stored, so cached analysis timestamps and
+    patient details are never served or retained for longer than that.
+    """
+    
+    def __init__(self, app, paths: List[str], max_entries: int = 1024, ttl_seconds: float = 60.0):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache = OrderedDict()  # key -> (stored_at, status, headers, body), oldest first
+    
+    def _evict_expired(self, now: float):
+        # Entries are kept in insertion order, so expired ones are always at the front
+        while self.cache:
+            stored_at = next(iter(self.cache.values()))[0]
+            if now - stored_at < self.ttl_seconds:
+                break
+            self.cache.popitem(last=False)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        # Clients can opt out with Cache-Control: no-store
+        for name, value in scope['headers']:
+            if name == b'cache-control' and b'no-store' in value.lower():
+                await self.app(scope, receive, send)
+                return
+        
+        # Read the full request body
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body = b''.join(chunks)
+        
+        key = hashlib.blake2b(scope['path'].encode() + b'\0' + body, digest_size=16).digest()
+        self._evict_expired(time.monotonic())
+        cached = self.cache.get(key)
+        if cached is not None:
+            _, status, headers, response_body = cached
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': response_body})
+            return
+        
+        # Replay the body we consumed to the app and capture its response
+        body_replayed = False
+        
+        async def replay_receive():
+            nonlocal body_replayed
+            if not body_replayed:
+                body_replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+        
+        response_start = {}
+        response_chunks = []
+        
+        async def capture_send(message):
+            if message['type'] == 'http.response.start':
+                response_start.update(message)
+            elif message['type'] == 'http.response.body':
+                response_chunks.append(message.get('body', b''))
+                if not message.get('more_body', False) and response_start.get('status') == 200:
+                    self.cache.pop(key, None)
+                    self.cache[key] = (
+                        time.monotonic(), 200, list(response_start.get('headers', [])), b''.join(response_chunks)
+                    )
+                    if len(self.cache) > self.max_entries:
+                        self.cache.popitem(last=False)
+            await send(message)
+        
+        await self.app(scope, replay_receive, capture_send)
 
 app = FastAPI(
+    default_response_class=NumpyORJSONResponse,
     title="Medical Analytics Service",
     description="Python-based medical data analysis and visualization service",
     version="1.0.0"
 )
 
+# Briefly cache responses of the deterministic analysis endpoints; added before CORS so
+# CORS stays the outermost middleware and applies to cached responses too
+app.add_middleware(
+    ResponseCacheMiddleware,
+    paths=["/analyze-labs", "/detect-outliers", "/risk-assessment", "/generate-insights"],
+    max_entries=1024,
+    ttl_seconds=60,
+)
+
 # Add CORS middleware to allow requests from the frontend
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +137,8 @@ app.add_middleware(
 
 # Data models
 class LabValue(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+    
     name: str
     value: float
     unit: str
@@ -40,22 +147,158 @@ class LabValue(BaseModel):
     category: Optional[str] = None
 
 class LabAnalysisRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+    
     patient_id: Optional[int] = None
     patient_name: Optional[str] = None
     lab_values: List[LabValue]
     analysis_type: str = "comprehensive"
 
 class LabReport(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+    
     patient_id: Optional[int] = None
     patient_name: Optional[str] = None
     test_date: str
     lab_values: List[Dict[str, Any]]
 
 class TrendAnalysisRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+    
     patient_id: int
     biomarker: str
     time_period: str = "6_months"  # 1_month, 3_months, 6_months, 1_year
 
+# Risk factors for common conditions
+RISK_FACTORS = {
+    'cardiovascular': ['cholesterol_total', 'ldl', 'hdl', 'triglycerides', 'crp', 'homocysteine'],
+    'diabetes': ['glucose', 'hba1c', 'insulin', 'c_peptide'],
+    'liver': ['alt', 'ast', 'bilirubin', 'albumin', 'alp'],
+    'kidney': ['creatinine', 'bun', 'egfr', 'protein'],
+    'thyroid': ['tsh', 't4', 't3', 'reverse_t3'],
+    'inflammation': ['crp', 'esr', 'il6', 'tnf_alpha']
+}
+
+# Map each marker substring to the conditions that use it
+_MARKER_TO_CONDS = {}
+for _condition, _markers in RISK_FACTORS.items():
+    for _marker in _markers:
+        _MARKER_TO_CONDS.setdefault(_marker, []).append(_condition)
+
+# One named group per marker inside a lookahead, so overlapping markers
+# (e.g. alp inside tnf_alpha) are all reported by finditer
+_MARKER_RE = re.compile('(?=' + '|'.join(f'(?P<{m}>{re.escape(m)})' for m in _MARKER_TO_CONDS) + ')')
+
+# Lab name normalization for marker matching: spaces and hyphens become underscores
+_NORM_TABLE = str.maketrans({' ': '_', '-': '_'})
+
+# Numeric kernels
+@numba.njit(error_model='numpy')
+def _compute_abnormal(values, ref_min, ref_max, out_abn, out_sev_high, out_low, out_pct):
+    """Flag abnormal, severe and low values and their percent deviation from the range midpoint"""
+    for i in range(values.shape[0]):
+        value = values[i]
+        lo = ref_min[i]
+        hi = ref_max[i]
+        low = value < lo
+        abn = not (np.isnan(lo) or np.isnan(hi)) and (low or value > hi)
+        out_low[i] = low
+        out_abn[i] = abn
+        out_sev_high[i] = abn and (value < lo * 0.7 or value > hi * 1.3)
+        out_pct[i] = abs((value - (lo + hi) * 0.5) / ((hi - lo) * 0.5)) * 100
+
+@numba.njit(error_model='numpy')
+def _zscore_iqr_masks(data, z_scores, z_mask, iqr_mask, q1, q3, mean, std):
+    """Compute absolute z-scores and the |z| > 2 and 1.5 * IQR outlier masks"""
+    inv_std = 1.0 / std
+    iqr = q3 - q1
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+    for i in range(data.shape[0]):
+        value = data[i]
+        z = abs(value - mean) * inv_std
+        z_scores[i] = z
+        z_mask[i] = z > 2
+        iqr_mask[i] = value < lower_bound or value > upper_bound
+
+# Compile the kernels at import so the first request doesn't pay JIT latency. There is no
+# on-disk numba cache: it records the importing module's name and breaks loading main.py
+# under another name (e.g. `python3 main.py` vs `import python_services.main`).
+_warmup = np.ones(1, dtype=np.float64)
+_compute_abnormal(_warmup, _warmup, _warmup, np.empty(1, dtype=np.bool_), np.empty(1, dtype=np.bool_),
+                  np.empty(1, dtype=np.bool_), np.empty(1, dtype=np.float64))
+_zscore_iqr_masks(_warmup, np.empty(1, dtype=np.float64), np.empty(1, dtype=np.bool_), np.empty(1, dtype=np.bool_),
+                  1.0, 1.0, 1.0, 1.0)
+del _warmup
+
+# Shared feature extraction
+def _compute_features(labs: List[LabValue]) -> Dict[str, Any]:
+    """Build the per-request arrays and masks shared by the analysis helpers"""
+    # Keep lab values as parallel arrays; missing reference bounds become NaN
+    n = len(labs)
+    values = np.fromiter((lab.value for lab in labs), dtype=np.float64, count=n)
+    ref_min = np.fromiter(
+        (np.nan if lab.reference_range_min is None else lab.reference_range_min for lab in labs),
+        dtype=np.float64, count=n
+    )
+    ref_max = np.fromiter(
+        (np.nan if lab.reference_range_max is None else lab.reference_range_max for lab in labs),
+        dtype=np.float64, count=n
+    )
+    
+    # Abnormal values
+    abn = np.empty(n, dtype=np.bool_)
+    sev_high = np.empty(n, dtype=np.bool_)
+    low = np.empty(n, dtype=np.bool_)
+    pct_dev = np.empty(n, dtype=np.float64)
+    _compute_abnormal(values, ref_min, ref_max, abn, sev_high, low, pct_dev)
+    
+    features = {
+        'n': n,
+        'values': values,
+        'ref_min': ref_min,
+        'ref_max': ref_max,
+        'names': [lab.name for lab in labs],
+        'units': [lab.unit for lab in labs],
+        'categories': [lab.category or 'general' for lab in labs],
+        'abn_mask': abn,
+        'sev_mask': sev_high,
+        'low_mask': low,
+        'pct_dev': pct_dev,
+        'mean': None,
+        'std': None,
+        'z_scores': None,
+        'z_mask': None,
+        'iqr_mask': None,
+        'q1': None,
+        'q3': None
+    }
+    
+    if n:
+        mean = values.mean()
+        std = values.std()
+        
+        # Both quartiles from a single quantile call
+        q1, q3 = np.quantile(values, [0.25, 0.75], method='linear')
+        
+        # Z-score and IQR outlier masks in one pass
+        z_scores = np.empty(n, dtype=np.float64)
+        z_mask = np.empty(n, dtype=np.bool_)
+        iqr_mask = np.empty(n, dtype=np.bool_)
+        _zscore_iqr_masks(values, z_scores, z_mask, iqr_mask, q1, q3, mean, std)
+        
+        features.update(mean=mean, std=std, z_scores=z_scores, z_mask=z_mask, iqr_mask=iqr_mask, q1=q1, q3=q3)
+    
+    # generate-insights shares one features dict across three helpers: make arrays read-only
+    # and lists immutable so one helper can't silently change what the next one sees
+    for key, item in features.items():
+        if isinstance(item, np.ndarray):
+            item.flags.writeable = False
+        elif isinstance(item, list):
+            features[key] = tuple(item)
+    
+    return features
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -80,178 +323,176 @@ async def health_check():
 
 # Lab values analysis
 @app.post("/analyze-labs")
-async def analyze_lab_values(request: LabAnalysisRequest):
+def analyze_lab_values(request: LabAnalysisRequest):
     """
     Analyze lab values and provide statistical insights
     """
     try:
-        # Convert lab values to DataFrame for analysis
-        lab_data = []
-        for lab in request.lab_values:
-            lab_data.append({
-                'name': lab.name,
-                'value': lab.value,
-                'unit': lab.unit,
-                'ref_min': lab.reference_range_min,
-                'ref_max': lab.reference_range_max,
-                'category': lab.category or 'general'
-            })
-        
-        df = pd.DataFrame(lab_data)
-        
-        # Perform statistical analysis
-        analysis_results = {
-            'patient_info': {
-                'patient_id': request.patient_id,
-                'patient_name': request.patient_name,
-                'analysis_date': datetime.now().isoformat(),
-                'total_markers': len(request.lab_values)
-            },
-            'statistical_summary': {
-                'mean_values': df['value'].mean() if not df.empty else 0,
-                'std_deviation': df['value'].std() if not df.empty else 0,
-                'value_range': {
-                    'min': df['value'].min() if not df.empty else 0,
-                    'max': df['value'].max() if not df.empty else 0
-                }
-            },
-            'abnormal_markers': [],
-            'categories_analysis': {},
-            'risk_indicators': []
-        }
-        
-        # Identify abnormal values
-        for _, row in df.iterrows():
-            if pd.notna(row['ref_min']) and pd.notna(row['ref_max']):
-                if row['value'] < row['ref_min'] or row['value'] > row['ref_max']:
-                    severity = 'high' if (row['value'] < row['ref_min'] * 0.7 or row['value'] > row['ref_max'] * 1.3) else 'moderate'
-                    analysis_results['abnormal_markers'].append({
-                        'name': row['name'],
-                        'value': row['value'],
-                        'unit': row['unit'],
-                        'reference_range': f"{row['ref_min']}-{row['ref_max']}",
-                        'deviation': 'low' if row['value'] < row['ref_min'] else 'high',
-                        'severity': severity,
-                        'percentage_deviation': abs((row['value'] - (row['ref_min'] + row['ref_max'])/2) / ((row['ref_max'] - row['ref_min'])/2)) * 100
-                    })
-        
-        # Category analysis
-        if not df.empty:
-            category_stats = df.groupby('category').agg({
-                'value': ['count', 'mean', 'std']
-            }).round(2)
-            
-            for category in df['category'].unique():
-                cat_data = df[df['category'] == category]
-                analysis_results['categories_analysis'][category] = {
-                    'marker_count': len(cat_data),
-                    'average_value': cat_data['value'].mean(),
-                    'abnormal_count': len([lab for lab in analysis_results['abnormal_markers'] 
-                                         if df[df['name'] == lab['name']]['category'].iloc[0] == category])
-                }
-        
-        # Risk assessment
-        high_risk_count = len([marker for marker in analysis_results['abnormal_markers'] if marker['severity'] == 'high'])
-        moderate_risk_count = len([marker for marker in analysis_results['abnormal_markers'] if marker['severity'] == 'moderate'])
-        
-        if high_risk_count > 0:
-            analysis_results['risk_indicators'].append({
-                'level': 'high',
-                'description': f'{high_risk_count} markers with significant deviations detected',
-                'recommendation': 'Immediate medical consultation recommended'
-            })
-        elif moderate_risk_count > 2:
-            analysis_results['risk_indicators'].append({
-                'level': 'moderate',
-                'description': f'{moderate_risk_count} markers outside normal ranges',
-                'recommendation': 'Follow-up testing and lifestyle modifications suggested'
-            })
-        else:
-            analysis_results['risk_indicators'].append({
-                'level': 'low',
-                'description': 'Most markers within acceptable ranges',
-                'recommendation': 'Continue current health maintenance practices'
-            })
-        
-        return {
-            "success": True,
-            "data": analysis_results
-        }
-        
+        now_iso = datetime.now().isoformat()
+        return NumpyORJSONResponse(_analyze_lab_values(request, _compute_features(request.lab_values), now_iso))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+def _analyze_lab_values(request: LabAnalysisRequest, features: Dict[str, Any], now_iso: str):
+    """Build the lab analysis response from precomputed features"""
+    n = features['n']
+    values = features['values']
+    ref_min = features['ref_min']
+    ref_max = features['ref_max']
+    names = features['names']
+    units = features['units']
+    abn = features['abn_mask']
+    sev_high = features['sev_mask']
+    low = features['low_mask']
+    pct_dev = features['pct_dev']
+    
+    # Identify abnormal values
+    abnormal_markers = [
+        {
+            'name': names[idx],
+            'value': float(values[idx]),
+            'unit': units[idx],
+            'reference_range': f"{ref_min[idx]}-{ref_max[idx]}",
+            'deviation': 'low' if low[idx] else 'high',
+            'severity': 'high' if sev_high[idx] else 'moderate',
+            'percentage_deviation': float(pct_dev[idx])
+        }
+        for idx in np.flatnonzero(abn).tolist()
+    ]
+    
+    # Perform statistical analysis
+    analysis_results = {
+        'patient_info': {
+            'patient_id': request.patient_id,
+            'patient_name': request.patient_name,
+            'analysis_date': now_iso,
+            'total_markers': n
+        },
+        'statistical_summary': {
+            'mean_values': float(values.mean()) if n else 0,
+            'std_deviation': float(values.std(ddof=1)) if n > 1 else 0,
+            'value_range': {
+                'min': float(values.min()) if n else 0,
+                'max': float(values.max()) if n else 0
+            }
+        },
+        'abnormal_markers': abnormal_markers,
+        'categories_analysis': {},
+        'risk_indicators': []
+    }
+    
+    # Category analysis
+    if n:
+        cat_labels, inverse = np.unique(np.array(features['categories'], dtype=object), return_inverse=True)
+        counts = np.bincount(inverse, minlength=cat_labels.size)
+        sums = np.bincount(inverse, weights=values, minlength=cat_labels.size)
+        means = sums / counts
+        abn_counts = np.bincount(inverse, weights=abn.astype(np.int64), minlength=cat_labels.size)
+        
+        for i, category in enumerate(cat_labels.tolist()):
+            analysis_results['categories_analysis'][category] = {
+                'marker_count': int(counts[i]),
+                'average_value': float(means[i]),
+                'abnormal_count': int(abn_counts[i])
+            }
+    
+    # Risk assessment
+    high_risk_count = int(np.count_nonzero(sev_high))
+    moderate_risk_count = len(analysis_results['abnormal_markers']) - high_risk_count
+    
+    if high_risk_count > 0:
+        analysis_results['risk_indicators'].append({
+            'level': 'high',
+            'description': f'{high_risk_count} markers with significant deviations detected',
+            'recommendation': 'Immediate medical consultation recommended'
+        })
+    elif moderate_risk_count > 2:
+        analysis_results['risk_indicators'].append({
+            'level': 'moderate',
+            'description': f'{moderate_risk_count} markers outside normal ranges',
+            'recommendation': 'Follow-up testing and lifestyle modifications suggested'
+        })
+    else:
+        analysis_results['risk_indicators'].append({
+            'level': 'low',
+            'description': 'Most markers within acceptable ranges',
+            'recommendation': 'Continue current health maintenance practices'
+        })
+    
+    return {
+        "success": True,
+        "data": analysis_results
+    }
+
 # Outlier detection
 @app.post("/detect-outliers")
-async def detect_outliers(request: LabAnalysisRequest):
+def detect_outliers(request: LabAnalysisRequest):
     """
     Detect statistical outliers in lab values using Z-score and IQR methods
     """
     try:
-        values = [lab.value for lab in request.lab_values]
-        names = [lab.name for lab in request.lab_values]
-        
-        if len(values) < 3:
-            return {
-                "success": True,
-                "data": {
-                    "outliers": [],
-                    "message": "Insufficient data points for outlier detection (minimum 3 required)"
-                }
-            }
-        
-        # Convert to numpy array
-        data = np.array(values)
-        
-        # Z-score method (outliers if |z| > 2)
-        z_scores = np.abs((data - np.mean(data)) / np.std(data))
-        z_outliers = np.where(z_scores > 2)[0]
-        
-        # IQR method
-        q1 = np.percentile(data, 25)
-        q3 = np.percentile(data, 75)
-        iqr = q3 - q1
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
-        iqr_outliers = np.where((data < lower_bound) | (data > upper_bound))[0]
-        
-        # Combine outlier detection methods
-        outlier_indices = list(set(z_outliers) | set(iqr_outliers))
-        
-        outliers = []
-        for idx in outlier_indices:
-            outliers.append({
-                'name': names[idx],
-                'value': values[idx],
-                'z_score': z_scores[idx],
-                'method': 'both' if idx in z_outliers and idx in iqr_outliers else 
-                         'z_score' if idx in z_outliers else 'iqr',
-                'severity': 'high' if z_scores[idx] > 3 else 'moderate'
-            })
-        
+        return NumpyORJSONResponse(_detect_outliers(_compute_features(request.lab_values)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Outlier detection failed: {str(e)}")
+
+def _detect_outliers(features: Dict[str, Any]):
+    """Build the outlier detection response from precomputed features"""
+    n = features['n']
+    
+    if n < 3:
         return {
             "success": True,
             "data": {
-                "outliers": outliers,
-                "statistics": {
-                    "total_markers": len(values),
-                    "outlier_count": len(outliers),
-                    "outlier_percentage": (len(outliers) / len(values)) * 100,
-                    "mean": np.mean(data),
-                    "std": np.std(data),
-                    "q1": q1,
-                    "q3": q3,
-                    "iqr": iqr
-                }
+                "outliers": [],
+                "message": "Insufficient data points for outlier detection (minimum 3 required)"
             }
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Outlier detection failed: {str(e)}")
+    
+    data = features['values']
+    names = features['names']
+    z_scores = features['z_scores']
+    q1 = features['q1']
+    q3 = features['q3']
+    
+    z_mask = features['z_mask']
+    iqr_mask = features['iqr_mask']
+    iqr = q3 - q1
+    
+    # Combine outlier detection methods with elementwise mask operations
+    any_mask = z_mask | iqr_mask
+    both_mask = z_mask & iqr_mask
+    
+    outliers = []
+    for idx in np.flatnonzero(any_mask):
+        outliers.append({
+            'name': names[idx],
+            'value': float(data[idx]),
+            'z_score': float(z_scores[idx]),
+            'method': 'both' if both_mask[idx] else 
+                     'z_score' if z_mask[idx] else 'iqr',
+            'severity': 'high' if z_scores[idx] > 3 else 'moderate'
+        })
+    
+    return {
+        "success": True,
+        "data": {
+            "outliers": outliers,
+            "statistics": {
+                "total_markers": n,
+                "outlier_count": len(outliers),
+                "outlier_percentage": (len(outliers) / n) * 100,
+                "mean": float(features['mean']),
+                "std": float(features['std']),
+                "q1": float(q1),
+                "q3": float(q3),
+                "iqr": float(iqr)
+            }
+        }
+    }
 
 # Biomarker trend analysis
 @app.post("/biomarker-trends")
-async def analyze_biomarker_trends(request: TrendAnalysisRequest):
+def analyze_biomarker_trends(request: TrendAnalysisRequest):
     """
     Analyze trends for specific biomarkers over time
     Note: This is a simulation - in real implementation, you'd query historical data
@@ -269,13 +510,17 @@ async def analyze_biomarker_trends(request: TrendAnalysisRequest):
         days = periods.get(request.time_period, 180)
         
         # Generate simulated trend data
-        dates = pd.date_range(end=datetime.now(), periods=min(days//7, 20), freq='W')
+        n_points = min(days//7, 20)
+        now = datetime.now()
+        dates = [now - timedelta(weeks=n_points - 1 - i) for i in range(n_points)]
         
         # Simulate values with some trend and noise
         base_value = 100
-        trend = np.random.normal(0, 5, len(dates))
-        noise = np.random.normal(0, 10, len(dates))
-        values = base_value + trend.cumsum() + noise
+        rng = np.random.default_rng()
+        samples = rng.standard_normal((2, len(dates)))
+        trend = 5.0 * samples[0]
+        noise = 10.0 * samples[1]
+        values = base_value + np.cumsum(trend) + noise
         
         trend_data = []
         for i, (date, value) in enumerate(zip(dates, values)):
@@ -285,13 +530,11 @@ async def analyze_biomarker_trends(request: TrendAnalysisRequest):
                 'week': i + 1
             })
         
-        # Calculate trend statistics
-        df = pd.DataFrame({'date': dates, 'value': values})
-        
-        # Linear regression for trend
-        x = np.arange(len(values))
-        coefficients = np.polyfit(x, values, 1)
-        trend_slope = coefficients[0]
+        # Least-squares slope against the week index: cov(x, y) / var(x)
+        n = values.size
+        dx = np.arange(n) - (n - 1) * 0.5
+        trend_slope = float(dx @ (values - values.mean()) / (dx @ dx))
+        diffs = np.diff(values)
         
         trend_analysis = {
             'patient_id': request.patient_id,
@@ -306,7 +549,7 @@ async def analyze_biomarker_trends(request: TrendAnalysisRequest):
                 'std_deviation': np.std(values),
                 'trend_slope': trend_slope,
                 'trend_direction': 'increasing' if trend_slope > 0.5 else 'decreasing' if trend_slope < -0.5 else 'stable',
-                'volatility': np.std(np.diff(values))
+                'volatility': diffs.std()
             },
             'insights': []
         }
@@ -327,82 +570,82 @@ async def analyze_biomarker_trends(request: TrendAnalysisRequest):
                 'severity': 'moderate'
             })
         
-        return {
+        return NumpyORJSONResponse({
             "success": True,
             "data": trend_analysis
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Trend analysis failed: {str(e)}")
 
 # Risk assessment
 @app.post("/risk-assessment")
-async def calculate_risk_assessment(request: LabAnalysisRequest):
+def calculate_risk_assessment(request: LabAnalysisRequest):
     """
     Calculate comprehensive risk assessment based on lab values
     """
     try:
-        # Risk factors for common conditions
-        risk_factors = {
-            'cardiovascular': ['cholesterol_total', 'ldl', 'hdl', 'triglycerides', 'crp', 'homocysteine'],
-            'diabetes': ['glucose', 'hba1c', 'insulin', 'c_peptide'],
-            'liver': ['alt', 'ast', 'bilirubin', 'albumin', 'alp'],
-            'kidney': ['creatinine', 'bun', 'egfr', 'protein'],
-            'thyroid': ['tsh', 't4', 't3', 'reverse_t3'],
-            'inflammation': ['crp', 'esr', 'il6', 'tnf_alpha']
-        }
-        
-        # Normalize lab names for matching
-        lab_names = [lab.name.lower().replace(' ', '_').replace('-', '_') for lab in request.lab_values]
-        
-        risk_scores = {}
-        
-        for condition, markers in risk_factors.items():
-            matching_markers = []
-            abnormal_count = 0
-            
-            for i, lab in enumerate(request.lab_values):
-                normalized_name = lab_names[i]
-                if any(marker in normalized_name for marker in markers):
-                    matching_markers.append(lab.name)
-                    
-                    # Check if abnormal
-                    if lab.reference_range_min and lab.reference_range_max:
-                        if lab.value < lab.reference_range_min or lab.value > lab.reference_range_max:
-                            abnormal_count += 1
+        now_iso = datetime.now().isoformat()
+        return NumpyORJSONResponse(_calculate_risk_assessment(request, _compute_features(request.lab_values), now_iso))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Risk assessment failed: {str(e)}")
+
+def _calculate_risk_assessment(request: LabAnalysisRequest, features: Dict[str, Any], now_iso: str):
+    """Build the risk assessment response from precomputed features"""
+    # Normalize lab names for matching
+    lab_names = [name.lower().translate(_NORM_TABLE) for name in features['names']]
+    
+    abn_flags = features['abn_mask']
+    
+    matching_markers = {condition: [] for condition in RISK_FACTORS}
+    abnormal_counts = dict.fromkeys(RISK_FACTORS, 0)
+    
+    # Single pass over labs; a lab counts once per condition even if several markers match
+    for i, lab in enumerate(request.lab_values):
+        normalized_name = lab_names[i]
+        matched_conds = set()
+        for match in _MARKER_RE.finditer(normalized_name):
+            matched_conds.update(_MARKER_TO_CONDS[match.lastgroup])
+        
+        for condition in matched_conds:
+            matching_markers[condition].append(lab.name)
+            if abn_flags[i]:
+                abnormal_counts[condition] += 1
+    
+    risk_scores = {}
+    
+    for condition in RISK_FACTORS:
+        markers_found = matching_markers[condition]
+        if markers_found:
+            abnormal_count = abnormal_counts[condition]
+            risk_percentage = (abnormal_count / len(markers_found)) * 100
+            risk_level = 'low' if risk_percentage < 25 else 'moderate' if risk_percentage < 50 else 'high'
             
-            if matching_markers:
-                risk_percentage = (abnormal_count / len(matching_markers)) * 100
-                risk_level = 'low' if risk_percentage < 25 else 'moderate' if risk_percentage < 50 else 'high'
-                
-                risk_scores[condition] = {
-                    'risk_percentage': risk_percentage,
-                    'risk_level': risk_level,
-                    'markers_evaluated': matching_markers,
-                    'abnormal_markers': abnormal_count,
-                    'total_markers': len(matching_markers)
-                }
-        
-        # Overall health score
-        if risk_scores:
-            avg_risk = np.mean([score['risk_percentage'] for score in risk_scores.values()])
-            overall_health_score = max(0, 100 - avg_risk)
-        else:
-            overall_health_score = 85  # Default score when no specific risk factors found
-        
-        return {
-            "success": True,
-            "data": {
-                'patient_id': request.patient_id,
-                'overall_health_score': round(overall_health_score, 1),
-                'risk_assessments': risk_scores,
-                'recommendations': generate_health_recommendations(risk_scores),
-                'assessment_date': datetime.now().isoformat()
+            risk_scores[condition] = {
+                'risk_percentage': risk_percentage,
+                'risk_level': risk_level,
+                'markers_evaluated': markers_found,
+                'abnormal_markers': abnormal_count,
+                'total_markers': len(markers_found)
             }
+    
+    # Overall health score
+    if risk_scores:
+        avg_risk = np.mean([score['risk_percentage'] for score in risk_scores.values()])
+        overall_health_score = max(0, 100 - avg_risk)
+    else:
+        overall_health_score = 85  # Default score when no specific risk factors found
+    
+    return {
+        "success": True,
+        "data": {
+            'patient_id': request.patient_id,
+            'overall_health_score': round(overall_health_score, 1),
+            'risk_assessments': risk_scores,
+            'recommendations': generate_health_recommendations(risk_scores),
+            'assessment_date': now_iso
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Risk assessment failed: {str(e)}")
+    }
 
 def generate_health_recommendations(risk_scores):
     """Generate personalized health recommendations based on risk scores"""
@@ -437,29 +680,31 @@ def generate_health_recommendations(risk_scores):
 
 # Generate medical insights
 @app.post("/generate-insights")
-async def generate_medical_insights(request: LabAnalysisRequest):
+def generate_medical_insights(request: LabAnalysisRequest):
     """
     Generate comprehensive medical insights combining multiple analysis methods
     """
     try:
         # Run multiple analyses
-        analysis_result = await analyze_lab_values(request)
-        outlier_result = await detect_outliers(request)
-        risk_result = await calculate_risk_assessment(request)
+        now_iso = datetime.now().isoformat()
+        features = _compute_features(request.lab_values)
+        analysis_result = _analyze_lab_values(request, features, now_iso)
+        outlier_result = _detect_outliers(features)
+        risk_result = _calculate_risk_assessment(request, features, now_iso)
         
         # Combine insights
         combined_insights = {
             'patient_info': {
                 'patient_id': request.patient_id,
                 'patient_name': request.patient_name,
-                'analysis_date': datetime.now().isoformat(),
+                'analysis_date': now_iso,
                 'total_markers_analyzed': len(request.lab_values)
             },
             'executive_summary': {
                 'overall_health_score': risk_result['data']['overall_health_score'],
                 'abnormal_markers_count': len(analysis_result['data']['abnormal_markers']),
                 'outliers_detected': len(outlier_result['data']['outliers']),
-                'high_risk_areas': len([r for r in risk_result['data']['risk_assessments'].values() if r['risk_level'] == 'high'])
+                'high_risk_areas': sum(1 for r in risk_result['data']['risk_assessments'].values() if r['risk_level'] == 'high')
             },
             'detailed_analysis': {
                 'statistical_analysis': analysis_result['data'],
@@ -493,14 +738,32 @@ async def generate_medical_insights(request: LabAnalysisRequest):
             'Regular monitoring of trending biomarkers'
         ]
         
-        return {
+        return NumpyORJSONResponse({
             "success": True,
             "data": combined_insights
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Insight generation failed: {str(e)}")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Keep the default small: os.cpu_count() reports host cores inside containers, and
+    # every worker (plus this supervisor) imports numba and warms the JIT kernels.
+    # Set WORKERS explicitly on Railway and other container deployments.
+    workers = int(os.environ.get("WORKERS", 2))
+    limit_concurrency = os.environ.get("LIMIT_CONCURRENCY")
+    
+    # Each worker is a separate process, so CPU-bound requests scale across cores.
+    # Within a worker, CPU-bound handlers are plain def so they run in the threadpool
+    # instead of blocking the event loop. uvloop is not available on Windows.
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None
+    )
\ No newline at end of file